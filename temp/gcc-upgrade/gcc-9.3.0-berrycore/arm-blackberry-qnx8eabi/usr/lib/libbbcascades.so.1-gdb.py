@@ -18,6 +18,7 @@
  
 import gdb
 import itertools
+import os
 import re
 import sys
 
@@ -29,39 +30,110 @@ try:
 except ImportError:
     _use_gdb_pp = False
 
+if sys.version_info[0] > 2:
+    unichr = chr
+    intern = sys.intern
+
 REF_LIMIT  = 512
 SIZE_LIMIT = 512
 
-class QStringPrinter:
+#BERRYCORE_FAST_PP=1 is meant for IDE variable panels, which only need the raw members:
+#QString is left to gdb and containers only show their type, without reading the inferior until expanded
+_FAST = os.environ.get('BERRYCORE_FAST_PP') == '1'
+
+#child labels for the indices every container can reach, so iterating doesn't format a new string per element
+_IDX_LABELS = tuple('[%d]' % i for i in range(SIZE_LIMIT + 1))
+
+#unfortunately we can't use QTypeInfo<T>::isStatic as it's all inlined, so use
+#this list of types that use Q_DECLARE_TYPEINFO(T, Q_MOVABLE_TYPE)
+#(obviously it won't work for custom types)
+_MOVABLE_TYPES = frozenset(['QRect', 'QRectF', 'QString', 'QMargins', 'QLocale', 'QChar', 'QDate', 'QTime', 'QDateTime', 'QVector',
+    'QRegExpr', 'QPoint', 'QPointF', 'QByteArray', 'QSize', 'QSizeF', 'QBitArray', 'QLine', 'QLineF', 'QModelIndex', 'QPersitentModelIndex',
+    'QVariant', 'QFileInfo', 'QUrl', 'QXmlStreamAttribute', 'QXmlStreamNamespaceDeclaration', 'QXmlStreamNotationDeclaration',
+    'QXmlStreamEntityDeclaration'])
+#this list of types that use Q_DECLARE_TYPEINFO(T, Q_PRIMITIVE_TYPE) (from qglobal.h)
+_PRIMITIVE_TYPES = frozenset(['bool', 'char', 'signed char', 'uchar', 'short', 'ushort', 'int', 'uint', 'long', 'ulong', 'qint64', 'qunit64', 'float', 'double'])
+#type codes of values that may have a printer here (classes, possibly behind a reference or typedef)
+#everything else (ints, pointers, arrays...) is rejected by lookup_function right away
+_LOOKUP_CODES = frozenset([gdb.TYPE_CODE_STRUCT, gdb.TYPE_CODE_UNION, gdb.TYPE_CODE_TYPEDEF, gdb.TYPE_CODE_REF])
+
+#most QChars printed are ASCII, these don't need a new string each time
+_ASCII_CHARS = tuple([unichr(i) for i in range(128)])
+
+stringCache = {}
+
+#decoded text of size UTF-16 code units at addr in the selected inferior
+#the same strings get printed many times while the inferior is stopped, the cache is dropped as soon as it runs
+#the same address means something else in another inferior, so it is part of the key
+def _decode_utf16(addr, size):
+    inferior = gdb.selected_inferior()
+    #in non-stop mode other threads keep running (and writing memory) while this one is stopped,
+    #without any event telling us, so nothing is cached until all of them are stopped
+    running = isInferiorRunning(inferior)
+    if running:
+        stringCache.clear()
+
+    key = (inferior.num, addr, size)
+    text = stringCache.get(key)
+    if not text is None:
+        return text
+
+    #copy the raw UTF-16 once and let python's codec decode it (the target is little endian ARM)
+    buf = inferior.read_memory(addr, size * 2)
+    text = bytearray(buf).decode('utf-16-le', 'ignore')
+    if running:
+        return text
+    if len(stringCache) >= 4096:
+        stringCache.clear()
+    stringCache[key] = text
+    return text
+
+def isInferiorRunning(inferior):
+    for thread in inferior.threads():
+        if thread.is_running():
+            return True
+    return False
+
+def clearStringCache(event):
+    stringCache.clear()
+
+class QStringPrinter(object):
+    __slots__ = ('val',)
  
     def __init__(self, val):
         self.val = val
  
     def to_string(self):
-    	# Leveraging available reference counter to determine if object is initialized or not.
+        # Leveraging available reference counter to determine if object is initialized or not.
         try:
-            ref = self.val['d']['ref'] 
+            d = self.val['d']
+            ref = int(d['ref']['_q_value'])
             #let's do check ref['_q_value'] for value. if num in shared pointer is skyrocketing, there's something wrong
-            if ref['_q_value'] > 0 and ref['_q_value'] < REF_LIMIT: 
-                    size = self.val['d']['size']    		    		
+            if ref > 0 and ref < REF_LIMIT: 
+                    size = int(d['size'])
                     if size < 0 : return "not initialized."
                     if size == 0 : return "\"\""
-                    data = self.val['d']['data'] 
+                    data = d['data'] 
+                    #never fetch more than SIZE_LIMIT characters from the inferior, large strings get truncated
+                    text = _decode_utf16(int(data), min(size, SIZE_LIMIT))
+                    tail = '"'
                     if size > SIZE_LIMIT :    
-                            #python can at its best return only UTF-8!!!
-                            return '\"{0}...\" [Addr: {1}]'.format(data.cast(lookupType("char").pointer()).string(encoding = 'UTF-16', errors='ignore', length = (maxSize - 3) * 2).encode('utf-8'), data.address)
-                    return '\"{0}\"'.format(data.cast(lookupType("char").pointer()).string(encoding = 'UTF-16', errors='ignore', length = self.val['d']['size'] * 2).encode('utf-8'))
+                            tail = '..." [Addr: %s]' % data.address
+                    return '"%s%s' % (text, tail)
             return "Not initialized."
-        except:
+        except RuntimeError:
             return "Not initialized."
 
-class QByteArrayPrinter:
+class QByteArrayPrinter(object):
+    __slots__ = ('val',)
  
     def __init__(self, val):
         self.val = val
  
-    class _iterator:
+    class _iterator(object):
+        __slots__ = ('data', 'size', 'count')
         def __init__(self, data, size):
+            #data is the array contents as one fetched char[size], see children()
             self.data = data
             self.size = size
             self.count = 0
@@ -70,120 +142,143 @@ class QByteArrayPrinter:
             return self
  
         def next(self):
-            if self.count >= self.size or self.data == None:
+            if self.count >= self.size or self.data is None:
                 raise StopIteration
             count = self.count
-            self.count = self.count + 1
+            self.count += 1
             try:
-                return ('[%d]' % count, self.data[count])
-            except:
+                return (_IDX_LABELS[count] if count <= SIZE_LIMIT else '[%d]' % count, self.data[count])
+            except RuntimeError:
                 return ""
+
+        __next__ = next
  
     def children(self):
         try:
+            refOk, sizeOk, size = _validate(self.val)
             #first check for reference
-            if isReferenceCorrect(self) == False:
+            if not refOk:
                 return self._iterator(None, 0)
 
             #second check for size
-            size = 0;
-            if isSizeCorrect(self) == False:
+            if not sizeOk:
                 size = SIZE_LIMIT;
-            else:
-                size = self.val['d']['size']
 
-            return self._iterator(self.val['d']['data'], size)
-        except:
+            if size == 0:
+                return self._iterator(None, 0)
+
+            #fetch the whole array with a single read instead of one inferior access per byte,
+            #the bytes stay lvalues in the inferior's memory
+            data = self.val['d']['data']
+            data = data.cast(data.type.target().array(size - 1).pointer()).dereference()
+            data.fetch_lazy()
+            return self._iterator(data, size)
+        except RuntimeError:
             return self._iterator(None, 0)
 
     def to_string(self):    
         #todo: handle charset correctly
         try:
-            if isSizeCorrect(self) == False:
+            refOk, sizeOk, size = _validate(self.val)
+            if not sizeOk:
                 return "Array not initialized yet or too large to display"
             else:
                 return self.val['d']['data'].string()
-        except:
+        except (RuntimeError, UnicodeError): #data doesn't have to be valid text
             return "Not initialized."
  
     def display_hint (self):
         return 'string'
  
-class QListPrinter:
+class QListPrinter(object):
     "Print a QList"
+    __slots__ = ('val', 'container', 'qvariant', 'itype')
  
-    class _iterator:
+    class _iterator(object):
+        __slots__ = ('nodetype', 'd', 'count', 'isLarge', 'isPointer', 'nodetype_name', 'node_val_type',
+            'begin', 'size', 'array', 'isStatic', 'node_type')
         def __init__(self, nodetype, d):
             self.nodetype = nodetype
             self.d = d
             self.count = 0
+            if self.d is None or self.nodetype is None:
+                self.d = None
+                return
+
+            #the node layout only depends on the element type, so resolve it once per QList
+            #instead of once per element
+            #from QTypeInfo::isLarge
+            self.isLarge = self.nodetype.sizeof > lookupSize('void*')
+
+            self.isPointer = self.nodetype.code == gdb.TYPE_CODE_PTR
+
+            self.nodetype_name = str(self.nodetype)
+            if self.nodetype.tag in _MOVABLE_TYPES or self.nodetype_name in _PRIMITIVE_TYPES:
+                self.isStatic = False
+            else:
+                self.isStatic = not self.isPointer
+
+            self.node_val_type = lookupType('QList<%s>::Node' % self.nodetype_name)
+            if self.node_val_type is None:
+                self.d = None
+                return
+            if self.isLarge or self.isStatic: #see QList::Node::t()
+                self.node_type = self.node_val_type.pointer()
+            else:
+                self.node_type = self.node_val_type
+
+            #the list doesn't change while we are iterating it
+            self.begin = int(self.d['begin'])
+            self.size = int(self.d['end']) - self.begin
+            self.array = self.d['array']
+
+            #a Node and a Node* are both pointer sized, so the used part of the array can be viewed as one node_type[size]
+            #and fetched with a single read instead of one access per node, the nodes stay lvalues in the inferior's memory
+            if self.size > 0:
+                nodes = self.array[self.begin].address
+                self.array = nodes.cast(self.node_type.array(self.size - 1).pointer()).dereference()
+                self.array.fetch_lazy()
  
         def __iter__(self):
             return self
  
         def next(self):
-            if self.d == None:
+            if self.d is None:
                 raise StopIteration
             try:
-                if self.count >= self.d['end'] - self.d['begin']:
+                if self.count >= self.size:
                     raise StopIteration
                 count = self.count
-                array = self.d['array'][self.d['begin'] + count]
-
-                #from QTypeInfo::isLarge
-                isLarge = self.nodetype.sizeof > lookupType('void').pointer().sizeof
-
-                isPointer = self.nodetype.code == gdb.TYPE_CODE_PTR
-
-                #unfortunately we can't use QTypeInfo<T>::isStatic as it's all inlined, so use
-                #this list of types that use Q_DECLARE_TYPEINFO(T, Q_MOVABLE_TYPE)
-                #(obviously it won't work for custom types)
-                movableTypes = ['QRect', 'QRectF', 'QString', 'QMargins', 'QLocale', 'QChar', 'QDate', 'QTime', 'QDateTime', 'QVector',
-                'QRegExpr', 'QPoint', 'QPointF', 'QByteArray', 'QSize', 'QSizeF', 'QBitArray', 'QLine', 'QLineF', 'QModelIndex', 'QPersitentModelIndex',
-                'QVariant', 'QFileInfo', 'QUrl', 'QXmlStreamAttribute', 'QXmlStreamNamespaceDeclaration', 'QXmlStreamNotationDeclaration',
-                'QXmlStreamEntityDeclaration']
-                #this list of types that use Q_DECLARE_TYPEINFO(T, Q_PRIMITIVE_TYPE) (from qglobal.h)
-                primitiveTypes = ['bool', 'char', 'signed char', 'uchar', 'short', 'ushort', 'int', 'uint', 'long', 'ulong', 'qint64', 'qunit64', 'float', 'double']
-                if movableTypes.count(self.nodetype.tag) or primitiveTypes.count(str(self.nodetype)):
-                    isStatic = False
-                else:
-                    isStatic = not isPointer
-
-                if isLarge or isStatic: #see QList::Node::t()
-                    node = array.cast(lookupType('QList<%s>::Node' % self.nodetype).pointer())
-                else:
-                    node = array.cast(lookupType('QList<%s>::Node' % self.nodetype))
-                self.count = self.count + 1
-                return ('[%d]' % count, node['v'].cast(self.nodetype))
-            except:  
+                node = self.array[count]
+                self.count += 1
+                return (_IDX_LABELS[count] if count <= SIZE_LIMIT else '[%d]' % count, node['v'].cast(self.nodetype))
+            except RuntimeError:
                 raise StopIteration
 
+        __next__ = next
+
     def __init__(self, val, container, itype):
         try:
             self.val = val
             self.container = container
-            if itype == None:
+            if itype is None:
                 self.itype = self.val.type.template_argument(0)
             else:
                 self.itype = lookupType(itype)
 
-            try:
-                if str(self.itype) == str(lookupType('QVariant')):
-                    self.qvariant = True
-                    self.val = None
-                else:
-                    self.qvariant = False
-            except:
-                self.qvariant = False
+            self.qvariant = isQVariant(self.itype)
+            if self.qvariant:
+                self.val = None
 
-        except:
+        except RuntimeError:
+            self.qvariant = False
             self.val = None
             self.container = None
             self.itype = None
 
     def children(self):
         try:
-            if self.val == None:
+            if self.val is None:
                 return self._iterator(None, None)
 
             #first check for reference
@@ -191,19 +286,23 @@ class QListPrinter:
                 return self._iterator(None, None)
 
             #second check for size (this check is different to standard one)
-            if self.val['d']['end'] - self.val['d']['begin'] > 512:
+            d = self.val['d']
+            if int(d['end']) - int(d['begin']) > SIZE_LIMIT:
                 return self._iterator(None, None)
 
-            return self._iterator(self.itype, self.val['d'])
-        except:
+            return self._iterator(self.itype, d)
+        except RuntimeError:
             return self._iterator(None, None)
 
     def to_string(self):
         if self.qvariant == True:
             return "QVariant types printing not supported"
 
-        if self.val == None:
+        if self.val is None:
             return "Not initialized"
+
+        if _FAST:
+            return "%s<%s>" % ( self.container, self.itype )
         
         try:
             #first check for reference
@@ -211,93 +310,121 @@ class QListPrinter:
                 return "Not initialized"
 
             #second check for size (this check is different to standard one)      
-            if self.val['d']['end'] - self.val['d']['begin'] > 512:
+            d = self.val['d']
+            size = int(d['end']) - int(d['begin'])
+            if size > SIZE_LIMIT:
                 return "Not initialized or size too large to display"
 
             empty = ""
-            if self.val['d']['end'] == self.val['d']['begin']:
+            if size == 0:
                 empty = "empty "
 
             return "%s%s<%s>" % ( empty, self.container, self.itype )
-        except:
+        except RuntimeError:
             return "Not initialized"
 
-class QVectorPrinter:
+class QVectorPrinter(object):
     "Print a QVector"
+    __slots__ = ('val', 'container', 'itype', 'd')
  
-    class _iterator:
-        def __init__(self, nodetype, d, p):
-            self.nodetype = nodetype
+    class _iterator(object):
+        __slots__ = ('nodetype', 'd', 'p', 'count', 'size', 'array')
+        def __init__(self, d, p):
             self.d = d
             self.p = p
             self.count = 0
+            if self.d is None:
+                return
+
+            #the element type is taken from the array member itself (T array[1]), so this works
+            #even if the template argument of the QVector can't be resolved
+            self.nodetype = self.p['array'].type.strip_typedefs().target()
+
+            #size can't change while iterating and indexing a T* doesn't need the array member resolved every time
+            self.size = int(self.p['size'])
+            self.array = self.p['array'].cast(self.nodetype.pointer())
+
+            #view the elements as one T[size] and fetch it with a single read instead of one access per element,
+            #the elements are still lvalues in the inferior's memory (editable, with an address)
+            if self.size > 0:
+                self.array = self.array.cast(self.nodetype.array(self.size - 1).pointer()).dereference()
+                self.array.fetch_lazy()
  
         def __iter__(self):
             return self
  
         def next(self):
-            if self.d == None:
+            if self.d is None:
                 raise StopIteration
 
-            if self.count >= self.p['size']:
+            if self.count >= self.size:
                 raise StopIteration
             count = self.count
  
-            self.count = self.count + 1
-            return ('[%d]' % count, self.p['array'][count])
+            self.count += 1
+            return (_IDX_LABELS[count] if count <= SIZE_LIMIT else '[%d]' % count, self.array[count])
+
+        __next__ = next
  
     def __init__(self, val, container):
         try:
             self.val = val
             self.container = container
             self.itype = self.val.type.template_argument(0)
-        except:
+        except RuntimeError:
             self.d = None
             self.container = None
             self.itype = None
  
     def children(self):
         try:
-            if self.val == None:
-                return self._iterator(None, None, None)
+            if self.val is None:
+                return self._iterator(None, None)
 
+            refOk, sizeOk, size = _validate(self.val)
             #first check for reference
-            if isReferenceCorrect(self) == False:
-                return self._iterator(None, None, None)
+            if not refOk:
+                return self._iterator(None, None)
 
             #second check for size        
-            if isSizeCorrect(self) == False:
-                return self._iterator(None, None, None)
+            if not sizeOk:
+                return self._iterator(None, None)
 
-            return self._iterator(self.itype, self.val['d'], self.val['p'])
-        except:
-            return self._iterator(None, None, None)
+            return self._iterator(self.val['d'], self.val['p'])
+        except RuntimeError:
+            return self._iterator(None, None)
  
     def to_string(self):
-        if self.val == None:
+        if self.val is None:
             return "Not initialized"
+
+        if _FAST:
+            return "%s<%s>" % ( self.container, self.itype )
         
         try:
+            refOk, sizeOk, size = _validate(self.val)
             #first check for reference
-            if isReferenceCorrect(self) == False:
+            if not refOk:
                 return "Not initialized"
 
             #second check for size        
-            if isSizeCorrect(self) == False:
+            if not sizeOk:
                 return "Not initialized or size too large to display"
 
             empty = ""
-            if self.val['d']['size'] == 0:
+            if size == 0:
                 empty = "empty "
 
             return "%s%s<%s>" % ( empty, self.container, self.itype )
-        except:
+        except RuntimeError:
             return "Not initialized"
  
-class QLinkedListPrinter:
+class QLinkedListPrinter(object):
     "Print a QLinkedList"
+    __slots__ = ('val', 'itype')
  
-    class _iterator:
+    class _iterator(object):
+        __slots__ = ('nodetype', 'it', 'pos', 'size')
         def __init__(self, nodetype, begin, size):
             self.nodetype = nodetype
             self.it = begin
@@ -314,62 +441,71 @@ class QLinkedListPrinter:
             pos = self.pos
             val = self.it['t']
             self.it = self.it['n']
-            self.pos = self.pos + 1
-            return ('[%d]' % pos, val)
+            self.pos += 1
+            return (_IDX_LABELS[pos] if pos <= SIZE_LIMIT else '[%d]' % pos, val)
+
+        __next__ = next
  
     def __init__(self, val):
         try:
             self.val = val
             self.itype = self.val.type.template_argument(0)
-        except:
+        except RuntimeError:
             self.val = None
             self.itype = None
  
     def children(self):
         try:
-            if self.val == None:
+            if self.val is None:
                 return self._iterator(None, None, 0)
 
+            refOk, sizeOk, size = _validate(self.val)
             #first check for reference
-            if isReferenceCorrect(self) == False:
+            if not refOk:
                 return self._iterator(None, None, 0)
 
             #second check for size        
-            if isSizeCorrect(self) == False:
+            if not sizeOk:
                 return self._iterator(None, None, 0)
 
-            return self._iterator(self.itype, self.val['e']['n'], self.val['d']['size'])
-        except:
+            return self._iterator(self.itype, self.val['e']['n'], size)
+        except RuntimeError:
             return self._iterator(None, None, 0)
 
     def to_string(self):
-        if self.val == None:
+        if self.val is None:
             return "Not initialized"
 
+        if _FAST:
+            return "QLinkedList<%s>" % self.itype
+
         try:
+            refOk, sizeOk, size = _validate(self.val)
             #first check for reference
-            if isReferenceCorrect(self) == False:
+            if not refOk:
                 return "Not initialized"
 
             #second check for size        
-            if isSizeCorrect(self) == False:
+            if not sizeOk:
                 return "Not initialized or size too large to display"
 
             empty = ""
-            if self.val['d']['size'] == 0:
+            if size == 0:
                 empty = "empty "
 
             return "%sQLinkedList<%s>" % ( empty, self.itype )
-        except:
+        except RuntimeError:
             return "Not initialized"
 
-class QMapPrinter:
+class QMapPrinter(object):
     "Print a QMap"
+    __slots__ = ('val', 'container', 'qvariant', 'ktype', 'vtype')
  
-    class _iterator:
+    class _iterator(object):
+        __slots__ = ('val', 'ktype', 'vtype', 'size', 'node_type', 'node_ptr_type', '_payload', '_char_ptr_type', 'data_node', 'count', 'value')
         def __init__(self, val):
             self.val = val
-            if self.val == None:
+            if self.val is None:
                 return
 
             self.ktype = self.val.type.template_argument(0)
@@ -378,32 +514,33 @@ class QMapPrinter:
             if self.size == 0:
                 return
 
+            #the node layout is fixed for a given QMap<K, V>, so resolve it once instead of on every step
+            self.node_type = lookupType('QMapNode<%s, %s>' % (self.ktype, self.vtype))
+            if self.node_type is None:
+                self.val = None
+                return
+            self.node_ptr_type = self.node_type.pointer()
+            self._payload = self.node_type.sizeof - 2 * lookupSize("void*")
+            self._char_ptr_type = lookupType('char').pointer()
+
             self.data_node = self.val['e']['forward'][0]
             self.count = 0
  
         def __iter__(self):
             return self 
  
-        def payload (self):
-	    if self.val == None:
-		return None
-
-            nodeType = lookupType('QMapNode<%s, %s>' % (self.ktype, self.vtype))
-            return nodeType.sizeof - 2 * lookupType("void").pointer().sizeof
-
         def concrete (self, data_node):
-            if self.val == None:
-                print "self cal in concrete in NONE"
+            if self.val is None:
+                print("self cal in concrete in NONE")
                 return None
             try:
-                node_type = lookupType('QMapNode<%s, %s>' % (self.ktype, self.vtype)).pointer()
-                return (data_node.cast(lookupType('char').pointer()) - self.payload()).cast(node_type)
-            except:
-		self.value = None
+                return (data_node.cast(self._char_ptr_type) - self._payload).cast(self.node_ptr_type)
+            except RuntimeError:
+                self.value = None
                 return None
 
         def next(self):
-            if self.val == None:
+            if self.val is None:
                 raise StopIteration
 
             if self.size == 0:
@@ -412,11 +549,12 @@ class QMapPrinter:
             if self.data_node == self.val['e']:
                 raise StopIteration
 
-            if self.concrete(self.data_node) == None:
+            concrete = self.concrete(self.data_node)
+            if concrete is None:
                 raise StopIteration
 
-	    try:
-                node = self.concrete(self.data_node).dereference()
+            try:
+                node = concrete.dereference()
                 if self.count % 2 == 0: #we might poke to wrong memory location here, catch the exception
                     item = node['key']
                 else:
@@ -431,88 +569,115 @@ class QMapPrinter:
                     #print "---> ", ref['_q_value']                        
                     #print "----->", item['ref']['_q_value']
 
-                result = ('[%d]' % self.count, item)
-                self.count = self.count + 1
+                result = (_IDX_LABELS[self.count] if self.count <= SIZE_LIMIT else '[%d]' % self.count, item)
+                self.count += 1
                 return result 
-            except:
+            except RuntimeError:
                 raise StopIteration
 
+        __next__ = next
+
     def __init__(self, val, container):
         self.val = val
+        self.ktype = None
+        self.vtype = None
         try:
-            if str(self.val.type.template_argument(1)) == str(lookupType('QVariant')):
-                self.qvariant = True
+            #the template arguments never change for this value, resolve them once for every to_string
+            self.ktype = self.val.type.template_argument(0)
+            self.vtype = self.val.type.template_argument(1)
+            self.qvariant = isQVariant(self.vtype)
+            if self.qvariant:
                 self.val = None
-            else:
-                self.qvariant = False
-        except:
+        except RuntimeError:
             self.qvariant = False
 
         self.container = container
  
     def children(self):
         try:
-            if self.val == None:
+            if self.val is None:
                 return self._iterator(None)
 
+            refOk, sizeOk, size = _validate(self.val)
             #first check for reference
-            if isReferenceCorrect(self) == False:
+            if not refOk:
                 return self._iterator(None)
 
             #second check for size        
-            if isSizeCorrect(self) == False:
+            if not sizeOk:
                 return self._iterator(None)
 
             return self._iterator(self.val)
-        except:
+        except RuntimeError:
             return self._iterator(None)
 
     def to_string(self):
         if self.qvariant == True:
             return "QVariant types printing not supported"
 
-        if self.val == None:
+        if self.val is None:
             return "Not initialized"
+
+        if _FAST:
+            return "%s<%s, %s>" % ( self.container, self.ktype, self.vtype )
         
         try:
+            refOk, sizeOk, size = _validate(self.val)
             #first check for reference
-            if isReferenceCorrect(self) == False:
+            if not refOk:
                 return "Not initialized"
 
             #second check for size        
-            if isSizeCorrect(self) == False:
+            if not sizeOk:
                 return "Not initialized or size too large to display"
 
             empty = ""
-            if self.val['d']['size'] == 0:
+            if size == 0:
                 empty = "empty "
 
-            return "%s%s<%s, %s>" % ( empty, self.container, self.val.type.template_argument(0), self.val.type.template_argument(1) )
-        except:
+            return "%s%s<%s, %s>" % ( empty, self.container, self.ktype, self.vtype )
+        except RuntimeError:
             return "Not initialized"
  
     def display_hint (self):
         return 'map'
  
-class QHashPrinter:
+class QHashPrinter(object):
     "Print a QHash"
+    __slots__ = ('val', 'container', 'qvariant', 'ktype', 'vtype')
  
-    class _iterator:
+    class _iterator(object):
+        __slots__ = ('val', 'data_node', 'end_node', 'd', 'ktype', 'vtype', '_hash_node_ptr_type',
+            '_node_ptr_type', '_e', '_buckets', '_numBuckets', 'count')
         def __init__(self, val):
             self.val = val
-            if self.val == None:
+            #QSetPrinter walks data_node/end_node directly, keep them defined even if we bail out below
+            self.data_node = None
+            self.end_node = None
+            if self.val is None:
                 return
             try:
                 self.d = self.val['d']
                 self.ktype = self.val.type.template_argument(0)
                 self.vtype = self.val.type.template_argument(1)
-                self.end_node = self.d.cast(lookupType('QHashData::Node').pointer())
+                hashNodeType = lookupType('QHashNode<%s, %s>' % (self.ktype, self.vtype))
+                nodeType = lookupType('QHashData::Node')
+                if hashNodeType is None or nodeType is None:
+                    self.val = None
+                    return
+                self._hash_node_ptr_type = hashNodeType.pointer()
+                self._node_ptr_type = nodeType.pointer()
+                self.end_node = self.d.cast(self._node_ptr_type)
+                #the bucket array and its length don't change while we walk the hash
+                self._e = self.end_node
+                self._buckets = self.d['buckets']
+                self._numBuckets = int(self.d['numBuckets'])
                 self.data_node = self.firstNode()
-                if self.data_node == None:
+                if self.data_node is None:
                     self.val = None
 
                 self.count = 0
-            except:
+            except RuntimeError:
                 self.val = None
                 return
 
@@ -522,73 +687,45 @@ class QHashPrinter:
         def hashNode (self):
             try:
                 "Casts the current QHashData::Node to a QHashNode and returns the result. See also QHash::concrete()"
-                return self.data_node.cast(lookupType('QHashNode<%s, %s>' % (self.ktype, self.vtype)).pointer())
-            except:
+                return self.data_node.cast(self._hash_node_ptr_type)
+            except RuntimeError:
                 return None
 
         def firstNode (self):
             try:
                 "Get the first node, See QHashData::firstNode()."
-                e = self.d.cast(lookupType('QHashData::Node').pointer())
-                #print "QHashData::firstNode() e %s" % e
-                bucketNum = 0
-                bucket = self.d['buckets'][bucketNum]
-                #print "QHashData::firstNode() *bucket %s" % bucket
-                n = self.d['numBuckets']
-                #print "QHashData::firstNode() n %s" % n
-                while n:
-                    #print "QHashData::firstNode() in while, n %s" % n;
+                e = self._e
+                buckets = self._buckets
+                for bucketNum in range(self._numBuckets):
+                    bucket = buckets[bucketNum]
                     if bucket != e:
-                        #print "QHashData::firstNode() in while, return *bucket %s" % bucket
                         return bucket
-                    bucketNum += 1
-                    bucket = self.d['buckets'][bucketNum]
-                    #print "QHashData::firstNode() in while, new bucket %s" % bucket
-                    n -= 1
-                #print "QHashData::firstNode() return e %s" % e
                 return e
-            except:
+            except RuntimeError:
                 return None
 
         def nextNode (self, node):
             try:
                 "Get the nextNode after the current, see also QHashData::nextNode()."
-                #print "******************************** nextNode"
-                #print "nextNode: node %s" % node
-                next = node['next'].cast(lookupType('QHashData::Node').pointer())
+                next = node['next'].cast(self._node_ptr_type)
                 e = next
 
-                #print "nextNode: next %s" % next
                 if next['next']:
-                    #print "nextNode: return next"
                     return next
 
-                #print "nextNode: node->h %s" % node['h']
-                #print "nextNode: numBuckets %s" % self.d['numBuckets']
-                start = (node['h'] % self.d['numBuckets']) + 1
-                bucketNum = start
-                #print "nextNode: start %s" % start
-                bucket = self.d['buckets'][start]
-                #print "nextNode: bucket %s" % bucket
-                n = self.d['numBuckets'] - start
-                #print "nextNode: n %s" % n
-                while n:
-                    #print "nextNode: in while; n %s" % n
-                    #print "nextNode: in while; e %s" % e
-                    #print "nextNode: in while; *bucket %s" % bucket
+                h = int(node['h'])
+                start = (h % self._numBuckets) + 1
+                buckets = self._buckets
+                for bucketNum in range(start, self._numBuckets):
+                    bucket = buckets[bucketNum]
                     if bucket != e:
-                        #print "nextNode: in while; return bucket %s" % bucket
                         return bucket
-                    bucketNum += 1
-                    bucket = self.d['buckets'][bucketNum]
-                    n -= 1
-                #print "nextNode: return e %s" % e
                 return e
-            except:
+            except RuntimeError:
                 return None
  
         def next(self):
-            if self.val == None:
+            if self.val is None:
                 raise StopIteration
 
             "GDB iteration, first call returns key, second value and then jumps to the next hash node."
@@ -596,7 +733,7 @@ class QHashPrinter:
                 raise StopIteration
  
             node = self.hashNode()
-            if node == None:
+            if node is None:
                 raise StopIteration
                 
             if self.count % 2 == 0:
@@ -605,165 +742,200 @@ class QHashPrinter:
                 item = node['value']
                 self.data_node = self.nextNode(self.data_node)
                 
-            if self.data_node == None:
+            if self.data_node is None:
                 raise StopIteration
                 
-            self.count = self.count + 1
-            return ('[%d]' % self.count, item)
+            self.count += 1
+            return (_IDX_LABELS[self.count] if self.count <= SIZE_LIMIT else '[%d]' % self.count, item)
+
+        __next__ = next
  
     def __init__(self, val, container):
         self.val = val
+        self.ktype = None
+        self.vtype = None
         try:
-            if str(self.val.type.template_argument(1)) == str(lookupType('QVariant')):
-                self.qvariant = True
+            #the template arguments never change for this value, resolve them once for every to_string
+            self.ktype = self.val.type.template_argument(0)
+            self.vtype = self.val.type.template_argument(1)
+            self.qvariant = isQVariant(self.vtype)
+            if self.qvariant:
                 self.val = None
-            else:
-                self.qvariant = False
-        except:
+        except RuntimeError:
             self.qvariant = False
 
         self.container = container
  
     def children(self):
         try:
-            if self.val == None:
+            if self.val is None:
                 return self._iterator(None)
 
+            refOk, sizeOk, size = _validate(self.val)
             #first check for reference
-            if isReferenceCorrect(self) == False:
+            if not refOk:
                 return self._iterator(None)
 
             #second check for size        
-            if isSizeCorrect(self) == False:
+            if not sizeOk:
                 return self._iterator(None)
     
             return self._iterator(self.val)
-        except:
+        except RuntimeError:
             return self._iterator(None)
  
     def to_string(self):
         if self.qvariant == True:
             return "QVariant types printing not supported"
 
-        if self.val == None:
+        if self.val is None:
             return "Not initialized"
+
+        if _FAST:
+            return "%s<%s, %s>" % ( self.container, self.ktype, self.vtype )
         
         try:
+            refOk, sizeOk, size = _validate(self.val)
             #first check for reference
-            if isReferenceCorrect(self) == False:
+            if not refOk:
                 return "Not initialized"
 
             #second check for size        
-            if isSizeCorrect(self) == False:
+            if not sizeOk:
                 return "Not initialized or size too large to display"
 
             empty = ""
-            if self.val['d']['size'] == 0:
+            if size == 0:
                 empty = "empty "
  
-            return "%s%s<%s, %s>" % ( empty, self.container, self.val.type.template_argument(0), self.val.type.template_argument(1) )
-        except:
+            return "%s%s<%s, %s>" % ( empty, self.container, self.ktype, self.vtype )
+        except RuntimeError:
             return "Not initialized"
 
     def display_hint (self):
         return 'map'
  
+dateCache = {}
+
+#julian day -> (year, month, day), copied from Qt sources
+#the same few dates get printed over and over while stepping, so remember the last results
+def _jd_to_ymd(jd):
+    ymd = dateCache.get(jd)
+    if not ymd is None:
+        return ymd
+
+    if jd >= 2299161:
+        # Gregorian calendar starting from October 15, 1582
+        # This algorithm is from Henry F. Fliegel and Thomas C. Van Flandern
+        ell = jd + 68569
+        n = (4 * ell) // 146097
+        ell = ell - (146097 * n + 3) // 4
+        i = (4000 * (ell + 1)) // 1461001
+        ell = ell - (1461 * i) // 4 + 31
+        j = (80 * ell) // 2447
+        d = ell - (2447 * j) // 80
+        ell = j // 11
+        m = j + 2 - (12 * ell)
+        y = 100 * (n - 49) + i + ell
+    else:
+        # Julian calendar until October 4, 1582
+        # Algorithm from Frequently Asked Questions about Calendars by Claus Toendering
+        day = jd + 32082
+        dd = (4 * day + 3) // 1461
+        ee = day - (1461 * dd) // 4
+        mm = ((5 * ee) + 2) // 153
+        d = ee - (153 * mm + 2) // 5 + 1
+        m = mm + 3 - 12 * (mm // 10)
+        y = dd - 4800 + (mm // 10)
+        if y <= 0:
+            y -= 1 #there is no year 0
+
+    ymd = (y, m, d)
+    if len(dateCache) >= 256:
+        dateCache.clear()
+    dateCache[jd] = ymd
+    return ymd
+
+#milliseconds since midnight -> (hour, minute, second, msec)
+def _ms_to_hmsms(ds):
+    MSECS_PER_HOUR = 3600000
+    SECS_PER_MIN = 60
+    MSECS_PER_MIN = 60000
+
+    hour = ds // MSECS_PER_HOUR
+    minute = (ds % MSECS_PER_HOUR) // MSECS_PER_MIN
+    second = (ds // 1000) % SECS_PER_MIN
+    msec = ds % 1000
+    return (hour, minute, second, msec)
+
 #TODO missing good (reference) check if date is valid - failing!
-class QDatePrinter:
+class QDatePrinter(object):
+    __slots__ = ('val',)
  
     def __init__(self, val):
         self.val = val
  
     def to_string(self):
         try:
-            julianDay = self.val['jd']
+            julianDay = int(self.val['jd'])
             if julianDay == 0 or julianDay == 0xffffffff: #-1 means NullDate ==> invalid
                 return "Uninitialized or invalid QDate"
 
-            # Copied from Qt sources
-            if julianDay >= 2299161:
-                # Gregorian calendar starting from October 15, 1582
-                # This algorithm is from Henry F. Fliegel and Thomas C. Van Flandern
-                ell = julianDay + 68569;
-                n = (4 * ell) / 146097;
-                ell = ell - (146097 * n + 3) / 4;
-                i = (4000 * (ell + 1)) / 1461001;
-                ell = ell - (1461 * i) / 4 + 31;
-                j = (80 * ell) / 2447;
-                d = ell - (2447 * j) / 80;
-                ell = j / 11;
-                m = j + 2 - (12 * ell);
-                y = 100 * (n - 49) + i + ell;
-            else:
-                # Julian calendar until October 4, 1582
-                # Algorithm from Frequently Asked Questions about Calendars by Claus Toendering
-                julianDay += 32082;
-                dd = (4 * julianDay + 3) / 1461;
-                ee = julianDay - (1461 * dd) / 4;
-                mm = ((5 * ee) + 2) / 153;
-                d = ee - (153 * mm + 2) / 5 + 1;
-                m = mm + 3 - 12 * (mm / 10);
-                y = dd - 4800 + (mm / 10);
-                if y <= 0:
-                    --y;
-            return "%d-%02d-%02d" % (y, m, d)
-        except:
+            return "%d-%02d-%02d" % _jd_to_ymd(julianDay)
+        except RuntimeError:
             return "Not initialized"
  
 #TODO missing good (reference) check if time is valid
-class QTimePrinter:
+class QTimePrinter(object):
+    __slots__ = ('val',)
  
     def __init__(self, val):
         self.val = val
  
     def to_string(self):
         try:
-            ds = self.val['mds']
+            ds = int(self.val['mds'])
 
             if ds == -1 or ds > 86400000: #MSECS_PER_DAY = 86400000 same condition as isvalid in QT
                 return "Uninitialized or invalid QTime"
 
-            MSECS_PER_HOUR = 3600000
-            SECS_PER_MIN = 60
-            MSECS_PER_MIN = 60000
-
-            hour = ds / MSECS_PER_HOUR
-            minute = (ds % MSECS_PER_HOUR) / MSECS_PER_MIN
-            second = (ds / 1000)%SECS_PER_MIN
-            msec = ds % 1000
-            return "%02d:%02d:%02d.%03d" % (hour, minute, second, msec)
-        except:
+            return "%02d:%02d:%02d.%03d" % _ms_to_hmsms(ds)
+        except RuntimeError:
             return "Not initialized"
 
-class QDateTimePrinter:
+class QDateTimePrinter(object):
+    __slots__ = ('val',)
  
     def __init__(self, val):
         self.val = val
  
     def to_string(self):
         try:
-            #first check for reference
-            #val['d'] is a QDateTimePrivate, but for some reason casting to that doesn't work
-            #so we are usign this little strange way to dereference the value
-            reference = self.val['d'].cast(lookupType('char').pointer());
-            reference = reference.cast(lookupType('QAtomicInt').pointer()).dereference();
-            if reference['_q_value'] < 0 or reference['_q_value'] > REF_LIMIT:            
+            atomicType = lookupType('QAtomicInt')
+            dateType = lookupType('QDate')
+            timeType = lookupType('QTime')
+            if atomicType is None or dateType is None or timeType is None:
                 return "Not initialized"
 
             #val['d'] is a QDateTimePrivate, but for some reason casting to that doesn't work
-            #so work around by manually adjusting the pointer
-            date = self.val['d'].cast(lookupType('char').pointer());
-            date += lookupType('int').sizeof #increment for QAtomicInt ref;
-            date = date.cast(lookupType('QDate').pointer()).dereference();
-
-            time = self.val['d'].cast(lookupType('char').pointer());
-            time += lookupType('int').sizeof + lookupType('QDate').sizeof #increment for QAtomicInt ref; and QDate date;
-            time = time.cast(lookupType('QTime').pointer()).dereference();
+            #so work around by manually adjusting a char pointer to it
+            base = self.val['d'].cast(lookupType('char').pointer())
+
+            #first check for reference
+            reference = int(base.cast(atomicType.pointer()).dereference()['_q_value'])
+            if reference < 0 or reference > REF_LIMIT:            
+                return "Not initialized"
+
+            dateOffset = lookupSize('int') #skip QAtomicInt ref;
+            timeOffset = dateOffset + lookupSize('QDate') #and QDate date;
+            date = (base + dateOffset).cast(dateType.pointer()).dereference()
+            time = (base + timeOffset).cast(timeType.pointer()).dereference()
             return "%s %s" % (date, time)
-        except:
+        except RuntimeError:
             return "Not initialized"
  
-class QUrlPrinter:
+class QUrlPrinter(object):
+    __slots__ = ('val',)
  
     def __init__(self, val):
         self.val = val
@@ -774,31 +946,40 @@ class QUrlPrinter:
                 return "Not initialized"
 
             return self.val['d']['encodedOriginal']
-        except RuntimeError, error:
+        except RuntimeError as error:
             try:
                 #if no debug information is avaliable for Qt, try guessing the correct address for encodedOriginal
                 #problem with this is that if QUrlPrivate members get changed, this fails
-                offset = lookupType('int').sizeof
-                offset += offset % lookupType('void').pointer().sizeof #alignment
-                offset += lookupType('QString').sizeof * 6
-                offset += lookupType('QByteArray').sizeof
+                if lookupType('QString') is None or lookupType('QByteArray') is None:
+                    return "Not initialized"
+                offset = lookupSize('int')
+                offset += offset % lookupSize('void*') #alignment
+                offset += lookupSize('QString') * 6
+                offset += lookupSize('QByteArray')
                 encodedOriginal = self.val['d'].cast(lookupType('char').pointer());
                 encodedOriginal += offset
                 encodedOriginal = encodedOriginal.cast(lookupType('QByteArray').pointer()).dereference();
                 encodedOriginal = encodedOriginal['d']['data'].string()
                 return encodedOriginal
-            except:
+            except (RuntimeError, UnicodeError):
                 return "Not initialized"
-        except:
-            return "Not initialized"
  
-class QSetPrinter:
+class QSetPrinter(object):
     "Print a QSet"
+    __slots__ = ('val', 'itype')
  
     def __init__(self, val):
         self.val = val
+        self.itype = None
+
+    #the element type is resolved on first use and kept, it never changes for this value
+    def elementType(self):
+        if self.itype is None:
+            self.itype = self.val.type.template_argument(0)
+        return self.itype
  
-    class _iterator:
+    class _iterator(object):
+        __slots__ = ('hashIterator', 'count')
         def __init__(self, hashIterator):
             self.hashIterator = hashIterator
             self.count = 0
@@ -807,7 +988,7 @@ class QSetPrinter:
             return self
  
         def next(self):
-            if self.hashIterator == None:
+            if self.hashIterator is None:
                 raise StopIteration
 
             if self.hashIterator.data_node == self.hashIterator.end_node:
@@ -818,69 +999,84 @@ class QSetPrinter:
             item = node['key']
             self.hashIterator.data_node = self.hashIterator.nextNode(self.hashIterator.data_node)
  
-            self.count = self.count + 1
-            return ('[%d]' % (self.count-1), item)
+            count = self.count
+            self.count += 1
+            return (_IDX_LABELS[count] if count <= SIZE_LIMIT else '[%d]' % count, item)
+
+        __next__ = next
  
     def children(self):
         try:
+            q_hash = self.val['q_hash']
+            refOk, sizeOk, size = _validate(q_hash)
             #first check for reference
-            ref = self.val['q_hash']['d']['ref'] 
-            if ref['_q_value'] < 0 or ref['_q_value'] > REF_LIMIT:            
+            if not refOk:
                 return self._iterator(None)
 
             #second check for size        
-            if self.val['q_hash']['d']['size'] > SIZE_LIMIT:
+            if not sizeOk:
                 return self._iterator(None)
 
-            hashPrinter = QHashPrinter(self.val['q_hash'], None)
-            hashIterator = hashPrinter._iterator(self.val['q_hash'])
+            #only the hash walker is needed, not a whole QHashPrinter (which looks up the QVariant type)
+            hashIterator = QHashPrinter._iterator(q_hash)
             return self._iterator(hashIterator)
-        except:
+        except RuntimeError:
             return self._iterator(None)
  
     def to_string(self):
-        if self.val == None:
+        if self.val is None:
             return "Not initialized"
-        
+
         try:
+            #the element type comes from the debug info and can fail as well
+            if _FAST:
+                return "QSet<%s>" % self.elementType()
+
+            refOk, sizeOk, size = _validate(self.val['q_hash'])
             #first check for reference
-            ref = self.val['q_hash']['d']['ref']
-            if ref['_q_value'] < 0 or ref['_q_value'] > REF_LIMIT:            
+            if not refOk:
                 return "Not initialized"
 
             #second check for size        
-            if self.val['q_hash']['d']['size'] > SIZE_LIMIT:
+            if not sizeOk:
                 return "Not initialized or size too large to display"
                 
             empty = ""
-            if self.val['q_hash']['d']['size'] == 0:
+            if size == 0:
                 empty = "empty " #just add "<space>"
                
  
-            return "%sQSet<%s>" % ( empty , self.val.type.template_argument(0) )
-        except:
+            return "%sQSet<%s>" % ( empty , self.elementType() )
+        except RuntimeError:
             return "Not initialized"
 
 
 #TODO how to make this one safe, it is failing!?
-class QCharPrinter:
+class QCharPrinter(object):
+    __slots__ = ('val',)
  
     def __init__(self, val):
         self.val = val
  
     def to_string(self):
         try:
-            return unichr(self.val['ucs']).encode('utf-8')
-        except:
+            ucs = int(self.val['ucs'])
+            if ucs < 128:
+                return _ASCII_CHARS[ucs]
+            return unichr(ucs)
+        except RuntimeError:
             return "Not initialized"
 
     def display_hint (self):
         return 'string'
  
 def register_qt4_printers (obj):
-    if obj == None:
+    if obj is None:
         obj = gdb
  
+    #named and switchable, so it can be turned off with "disable pretty-printer global berrycore"
+    lookup_function.name = 'berrycore'
+    lookup_function.enabled = True
     obj.pretty_printers.append (lookup_function)
  
 def lookup_function (val):
@@ -889,6 +1085,11 @@ def lookup_function (val):
     # Get the type.
     type = val.type;
  
+    # Most values gdb prints aren't classes at all, don't bother
+    # stripping their typedefs.
+    if not type.code in _LOOKUP_CODES:
+        return None
+ 
     # If it points to a reference, get the reference.
     if type.code == gdb.TYPE_CODE_REF:
         type = type.target ()
@@ -898,15 +1099,37 @@ def lookup_function (val):
  
     # Get the type name.
     typename = type.tag
-    if typename == None:
+    if typename is None:
+        return None
+ 
+    # All of the printed Qt classes start with a Q.
+    if not typename.startswith ('Q'):
         return None
  
-    # Iterate over local dictionary of types to determine
-    # if a printer is registered for that type.  Return an
-    # instantiation of the printer if found.
-    for function in pretty_printers_dict:
-        if function.search (typename):
-            return pretty_printers_dict[function] (val)
+    # gdb keeps asking about the same few types, so the printer
+    # constructor (or None) found for a type name is remembered.
+    constructor = printerCache.get (typename, _MISSING)
+    if constructor is _MISSING:
+        # The table is only built once a Qt looking type shows up,
+        # sessions that never print one don't compile the patterns.
+        if pretty_printers_regex is None:
+            build_dictionary ()
+            compile_dictionary ()
+
+        typename = intern (typename)
+        # Check the exact names first, then match against the combined
+        # patterns of the local dictionary to determine if a printer is
+        # registered for that type.
+        constructor = pretty_printers_exact.get (typename)
+        if constructor is None:
+            match = pretty_printers_regex.match (typename)
+            if match:
+                constructor = pretty_printers_ctors[match.lastgroup]
+        printerCache[typename] = constructor
+
+    # Return an instantiation of the printer if found.
+    if not constructor is None:
+        return constructor (val)
  
     # Cannot find a pretty printer.  Return None.
     return None
@@ -915,35 +1138,48 @@ def lookup_function (val):
 #if this number is less than 0 then it is invalid, if the number is higher than 512 it is really suspicious
 def isReferenceCorrect(object):
     #first check for reference
-    ref = object.val['d']['ref'] 
-    if ref['_q_value'] < 0 or ref['_q_value'] > REF_LIMIT:            
+    ref = int(object.val['d']['ref']['_q_value'])
+    if ref < 0 or ref > REF_LIMIT:            
         return False
     else:
         return True
 
-#check for size (number of elements) of object  stored in d.size
-#if this number is less than 0 then it is invalid, if the number is higher than 512 then we are unable to display it - without performance issues (it still can be invalid)
-def isSizeCorrect(object):
-    #second check for size        
-    if object.val['d']['size'] < 0  or object.val['d']['size'] > SIZE_LIMIT:
-        return False
-    else:
-        return True
+#checks the reference like isReferenceCorrect and the size (number of elements) stored in d.size, reading d only once
+#if the size is less than 0 it is invalid, if it is higher than 512 then we are unable to display it - without performance issues
+#returns (reference ok, size ok, size), the size is returned so callers don't have to fetch it again
+def _validate(val):
+    #fetch the whole private data in one read, the fields are then taken from that copy
+    d = val['d'].dereference()
+    d.fetch_lazy()
+    ref = int(d['ref']['_q_value'])
+    size = int(d['size'])
+    return (0 <= ref <= REF_LIMIT, 0 <= size <= SIZE_LIMIT, size)
+
+#QVariant contents can't be printed (yet), compares gdb types directly instead of their (recursively formatted) names
+def isQVariant(type):
+    qvariant = lookupType('QVariant')
+    return not type is None and not qvariant is None and type == qvariant
 
 typeCache = {}
 
+#types that can't be found are cached as None too, parse_and_eval is expensive and a miss doesn't turn into a hit
+#until a new objfile is loaded (which clears the cache)
 def lookupType(typestring):
-    type = typeCache.get(typestring)
+    type = typeCache.get(typestring, _MISSING)
     #warn("LOOKUP 1: %s -> %s" % (typestring, type))
-    if not type is None:
+    if not type is _MISSING:
         return type
 
-    if typestring == "void":
+    #the names end up as cache keys, interned they are compared by identity on later hits
+    typestring = intern(typestring)
+
+    #builtin types don't need the inferior's symbols (parsing "{char}&main" fails if there's no main)
+    if typestring == "void" or typestring == "char" or typestring == "int":
         type = gdb.lookup_type(typestring)
         typeCache[typestring] = type
         return type
 
-    if typestring.find("(anon") != -1:
+    if "(anon" in typestring:
         # gdb doesn't like
         # '(anonymous namespace)::AddAnalysisMessageSuppressionComment'
         typeCache[typestring] = None
@@ -951,35 +1187,94 @@ def lookupType(typestring):
 
     try:
         type = gdb.parse_and_eval("{%s}&main" % typestring).type
-        typeCache[typestring] = type
-        return type
-    except:
-        pass
+    except RuntimeError:
+        type = None
+    typeCache[typestring] = type
+    return type
 
+sizeCache = {}
+
+#sizes of the types used for manual pointer arithmetic, they only depend on the inferior's ABI
+def lookupSize(typestring):
+    size = sizeCache.get(typestring)
+    if not size is None:
+        return size
+
+    if typestring == "void*":
+        size = lookupType("void").pointer().sizeof
+    else:
+        size = lookupType(typestring).sizeof
+    sizeCache[typestring] = size
+    return size
+
+#a newly loaded objfile may bring other definitions (e.g. a rebuilt library), so forget everything resolved so far
+def clearTypeCaches(event):
+    typeCache.clear()
+    sizeCache.clear()
 
-def build_dictionary ():
-    pretty_printers_dict[re.compile('^QString$')] = lambda val: QStringPrinter(val)
-    pretty_printers_dict[re.compile('^QByteArray$')] = lambda val: QByteArrayPrinter(val)
-    pretty_printers_dict[re.compile('^QList<.*>$')] = lambda val: QListPrinter(val, 'QList', None)
-    pretty_printers_dict[re.compile('^QStringList$')] = lambda val: QListPrinter(val, 'QStringList', 'QString')
-    pretty_printers_dict[re.compile('^QQueue')] = lambda val: QListPrinter(val, 'QQueue', None)
-    pretty_printers_dict[re.compile('^QVector<.*>$')] = lambda val: QVectorPrinter(val, 'QVector')
-    pretty_printers_dict[re.compile('^QStack<.*>$')] = lambda val: QVectorPrinter(val, 'QStack')
-    pretty_printers_dict[re.compile('^QLinkedList<.*>$')] = lambda val: QLinkedListPrinter(val)
-    pretty_printers_dict[re.compile('^QMap<.*>$')] = lambda val: QMapPrinter(val, 'QMap')
-    pretty_printers_dict[re.compile('^QMultiMap<.*>$')] = lambda val: QMapPrinter(val, 'QMultiMap')
-    pretty_printers_dict[re.compile('^QHash<.*>$')] = lambda val: QHashPrinter(val, 'QHash')
-    pretty_printers_dict[re.compile('^QMultiHash<.*>$')] = lambda val: QHashPrinter(val, 'QMultiHash')
-    pretty_printers_dict[re.compile('^QDate$')] = lambda val: QDatePrinter(val)
-    pretty_printers_dict[re.compile('^QTime$')] = lambda val: QTimePrinter(val)
-    pretty_printers_dict[re.compile('^QDateTime$')] = lambda val: QDateTimePrinter(val)
-    pretty_printers_dict[re.compile('^QUrl$')] = lambda val: QUrlPrinter(val)
-    pretty_printers_dict[re.compile('^QSet<.*>$')] = lambda val: QSetPrinter(val)
-    pretty_printers_dict[re.compile('^QChar$')] = lambda val: QCharPrinter(val)
- 
- 
-pretty_printers_dict = {}
- 
-build_dictionary ()
 
+def build_dictionary ():
+    if not _FAST:
+        pretty_printers_dict.append(('QString', lambda val: QStringPrinter(val)))
+    pretty_printers_dict.append(('QByteArray', lambda val: QByteArrayPrinter(val)))
+    pretty_printers_dict.append(('QList<.*>', lambda val: QListPrinter(val, 'QList', None)))
+    pretty_printers_dict.append(('QStringList', lambda val: QListPrinter(val, 'QStringList', 'QString')))
+    pretty_printers_dict.append(('QQueue.*', lambda val: QListPrinter(val, 'QQueue', None)))
+    pretty_printers_dict.append(('QVector<.*>', lambda val: QVectorPrinter(val, 'QVector')))
+    pretty_printers_dict.append(('QStack<.*>', lambda val: QVectorPrinter(val, 'QStack')))
+    pretty_printers_dict.append(('QLinkedList<.*>', lambda val: QLinkedListPrinter(val)))
+    pretty_printers_dict.append(('QMap<.*>', lambda val: QMapPrinter(val, 'QMap')))
+    pretty_printers_dict.append(('QMultiMap<.*>', lambda val: QMapPrinter(val, 'QMultiMap')))
+    pretty_printers_dict.append(('QHash<.*>', lambda val: QHashPrinter(val, 'QHash')))
+    pretty_printers_dict.append(('QMultiHash<.*>', lambda val: QHashPrinter(val, 'QMultiHash')))
+    pretty_printers_dict.append(('QDate', lambda val: QDatePrinter(val)))
+    pretty_printers_dict.append(('QTime', lambda val: QTimePrinter(val)))
+    pretty_printers_dict.append(('QDateTime', lambda val: QDateTimePrinter(val)))
+    pretty_printers_dict.append(('QUrl', lambda val: QUrlPrinter(val)))
+    pretty_printers_dict.append(('QSet<.*>', lambda val: QSetPrinter(val)))
+    pretty_printers_dict.append(('QChar', lambda val: QCharPrinter(val)))
+ 
+ 
+#patterns that are plain type names (QString, QDate...) go into a dict of exact names
+#the others are combined into a single regex, each one wrapped in a named group, the name of the group that matched
+#tells which printer to use (names rather than numbers, so groups inside a pattern can't shift the other patterns)
+#so a lookup is one match instead of trying every pattern in turn
+def compile_dictionary ():
+    global pretty_printers_regex
+    pretty_printers_exact.clear()
+    pretty_printers_ctors.clear()
+    groups = []
+    for pattern, constructor in pretty_printers_dict:
+        if re.escape(pattern) == pattern:
+            pretty_printers_exact[pattern] = constructor
+        else:
+            name = 'p%d' % len(groups)
+            groups.append('(?P<%s>%s)' % (name, pattern))
+            pretty_printers_ctors[name] = constructor
+    pretty_printers_regex = re.compile('^(?:%s)\\Z' % '|'.join(groups))
+    printerCache.clear()
+ 
+#(pattern, printer constructor) in a fixed order, so the group numbers of the combined regex don't depend on dict order
+pretty_printers_dict = []
+pretty_printers_exact = {}
+pretty_printers_regex = None
+pretty_printers_ctors = {}
+#type name -> printer constructor, or None if there's no printer for it
+printerCache = {}
+_MISSING = object()
+ 
 register_qt4_printers (None)
+
+#gdb.events is only available in newer gdb versions, and not every version has all of the events
+def connectEvent(name, handler):
+    registry = getattr(getattr(gdb, 'events', None), name, None)
+    if not registry is None:
+        registry.connect(handler)
+
+connectEvent('new_objfile', clearTypeCaches)
+#once the inferior runs (or memory gets written, or another program or core file gets loaded) cached strings may be stale
+connectEvent('new_objfile', clearStringCache)
+connectEvent('cont', clearStringCache)
+connectEvent('inferior_call', clearStringCache)
+connectEvent('memory_changed', clearStringCache)
+connectEvent('exited', clearStringCache)